@@ -4,23 +4,72 @@ Provides METARs, TAFs, PIREPs, and SIGMETs/AIRMETs from aviationweather.gov
 for use as a Claude Chat custom connector.
 """
 
+import asyncio
 import json
 import logging
-from typing import Optional
-
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import anyio
 import httpx
 from mcp.server.fastmcp import FastMCP
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to stdlib json
+    orjson = None
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(format="[%(levelname)s] %(message)s", level=logging.INFO)
+logger.addHandler(logging.NullHandler())
 
 AWC_BASE = "https://aviationweather.gov/api/data"
 USER_AGENT = "aviation-weather-mcp/1.0 (Claude Chat Connector)"
 REQUEST_TIMEOUT = 15.0
+_STATIC_HEADERS = {"User-Agent": USER_AGENT}
+
+# Seconds a cached response stays fresh, per endpoint. METARs are issued
+# hourly, TAFs every ~6 hours, advisories and PIREPs change within minutes.
+CACHE_TTL = {
+    "metar": 60.0,
+    "taf": 300.0,
+    "airsigmet": 60.0,
+    "pirep": 60.0,
+    "stationinfo": 86400.0,
+}
+CACHE_MAX_ENTRIES = 256
+
+# Tool output is read by the model, not a person, so compact JSON is the
+# default. Set PRETTY_JSON=1 to indent it for debugging.
+PRETTY = os.environ.get("PRETTY_JSON", "").lower() in ("1", "true", "yes")
+
+# ---------------------------------------------------------------------------
+# JSON helpers
+# ---------------------------------------------------------------------------
+
+if orjson is not None:
+    _DUMPS_OPTION = orjson.OPT_INDENT_2 if PRETTY else 0
+
+    def _dumps(data) -> str:
+        """Serialize a parsed AWC payload to JSON text."""
+        return orjson.dumps(data, option=_DUMPS_OPTION).decode()
+
+    _loads = orjson.loads
+else:
+    _DUMPS_KWARGS = {"indent": 2} if PRETTY else {"separators": (",", ":")}
+
+    def _dumps(data) -> str:
+        """Serialize a parsed AWC payload to JSON text."""
+        return json.dumps(data, **_DUMPS_KWARGS)
+
+    _loads = json.loads
 
 # ---------------------------------------------------------------------------
 # MCP Server
@@ -38,28 +87,173 @@ mcp = FastMCP(
 # Shared HTTP helper
 # ---------------------------------------------------------------------------
 
-async def _awc_get(endpoint: str, params: dict) -> dict | list | str:
-    """Make a GET request to the aviationweather.gov API."""
-    url = f"{AWC_BASE}/{endpoint}"
-    headers = {"User-Agent": USER_AGENT}
+@dataclass(slots=True)
+class AwcResult:
+    """A decoded AWC response: parsed JSON when is_json, otherwise plain text.
+
+    cacheable is False for error payloads that must not be served from cache.
+    """
+
+    is_json: bool
+    data: Any
+    cacheable: bool = True
+
+
+class AwcFetchError(Exception):
+    """Raised to each caller of a shared AWC fetch that failed; wraps the original error."""
+
+
+_CLIENT: httpx.AsyncClient | None = None
+
+
+async def _get_client() -> httpx.AsyncClient:
+    """Return the shared AWC client, creating it on first use.
+
+    Reusing one client keeps the connection to aviationweather.gov alive
+    between tool calls instead of paying for a new TLS handshake each time.
+    """
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            base_url=AWC_BASE,
+            timeout=REQUEST_TIMEOUT,
+            headers=_STATIC_HEADERS,
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=10,
+                keepalive_expiry=60,
+            ),
+            http2=True,
+        )
+    return _CLIENT
+
+
+async def _close_client() -> None:
+    """Close the shared AWC client, if one was opened."""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+_CACHE: OrderedDict[tuple, tuple[float, AwcResult]] = OrderedDict()
+_INFLIGHT: dict[tuple, asyncio.Task] = {}
+
+
+def _cache_key(endpoint: str, params: dict) -> tuple:
+    """Build a hashable cache key from an endpoint and its query params."""
+    return (endpoint, tuple(sorted(params.items())))
+
+
+async def _awc_get(endpoint: str, params: dict) -> AwcResult:
+    """Make a GET request to the aviationweather.gov API, serving from cache when fresh."""
+    ttl = CACHE_TTL.get(endpoint, 0.0)
+    key = _cache_key(endpoint, params)
+    now = time.monotonic()
+
+    cached = _CACHE.get(key)
+    if cached is not None:
+        expires, result = cached
+        if now < expires:
+            _CACHE.move_to_end(key)
+            return result
+        del _CACHE[key]
+
+    # Concurrent callers for the same key share a single upstream request. The
+    # fetch runs in its own task so cancelling one caller never cancels the rest.
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_awc_fetch(endpoint, params))
+        task.add_done_callback(lambda t: _fetch_done(key, ttl, t))
+        _INFLIGHT[key] = task
+    try:
+        return await asyncio.shield(task)
+    except Exception as e:
+        # Give each caller its own exception rather than re-raising the shared one.
+        raise AwcFetchError(str(e)) from e
+
+
+def _fetch_done(key: tuple, ttl: float, task: asyncio.Task) -> None:
+    """Clear a finished in-flight fetch and cache its result if it succeeded."""
+    if _INFLIGHT.get(key) is task:
+        del _INFLIGHT[key]
+    # Checking exception() also marks a failure as retrieved when no caller is left.
+    if task.cancelled() or task.exception() is not None:
+        return
+    result = task.result()
+    if ttl > 0 and result.cacheable:
+        _CACHE[key] = (time.monotonic() + ttl, result)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_MAX_ENTRIES:
+            _CACHE.popitem(last=False)
+
+
+async def _awc_get_many(specs: list[tuple[str, dict]]) -> list[AwcResult]:
+    """Run several (endpoint, params) requests concurrently on the shared client.
+
+    Results come back in the same order as ``specs``.
+    """
+    return await asyncio.gather(*(_awc_get(endpoint, params) for endpoint, params in specs))
+
+
+# Non-error payloads for AWC status codes that should not raise.
+_STATUS_HANDLERS = {
+    204: lambda r: AwcResult(True, {"message": "No data available for this request."}),
+    400: lambda r: AwcResult(
+        True,
+        {"error": f"Bad request – check your parameters. Details: {r.text.strip()}"},
+        cacheable=False,
+    ),
+}
+
+
+async def _awc_fetch(endpoint: str, params: dict) -> AwcResult:
+    """Make an uncached GET request to the aviationweather.gov API."""
+    client = await _get_client()
+    resp = await client.get(endpoint, params=params)
+
+    handler = _STATUS_HANDLERS.get(resp.status_code)
+    if handler is not None:
+        return handler(resp)
+    resp.raise_for_status()
 
-    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-        resp = await client.get(url, params=params, headers=headers)
+    content_type = resp.headers.get("content-type", "")
+    if "json" in content_type:
+        # Parse the UTF-8 body bytes directly; never touch resp.text or resp.json().
+        return AwcResult(True, _loads(resp.content))
+    # AWC text formats are UTF-8; decode directly rather than letting httpx sniff the charset.
+    return AwcResult(False, resp.content.decode("utf-8", "replace").strip())
 
-        if resp.status_code == 204:
-            return {"message": "No data available for this request."}
-        if resp.status_code == 400:
-            return {"error": f"Bad request – check your parameters. Details: {resp.text.strip()}"}
-        resp.raise_for_status()
 
-        content_type = resp.headers.get("content-type", "")
-        if "json" in content_type:
-            return resp.json()
-        return resp.text.strip()
+# ICAO/IATA-style identifiers, or an AWC state group such as '@CA'.
+_ICAO = re.compile(r"^(?:[A-Z0-9]{3,4}|@[A-Z]{2})$")
+
+
+class InvalidStationIds(ValueError):
+    """Raised when a station id list is empty or malformed."""
+
+
+def _normalize_ids(ids: str) -> str:
+    """Uppercase, trim, dedupe, and sort a comma-separated station list.
+
+    Raises InvalidStationIds if the list is empty or contains a malformed
+    identifier, so bad input is rejected without a round trip to aviationweather.gov.
+    """
+    parts = {p.strip().upper() for p in ids.split(",") if p.strip()}
+    if not parts:
+        raise InvalidStationIds("No station identifiers given.")
+    bad = sorted(p for p in parts if not _ICAO.match(p))
+    if bad:
+        raise InvalidStationIds(f"Invalid station identifier(s): {', '.join(bad)}")
+    return ",".join(sorted(parts))
 
 
 def _handle_error(e: Exception) -> str:
     """Consistent error formatting."""
+    if isinstance(e, AwcFetchError) and e.__cause__ is not None:
+        e = e.__cause__
+    if isinstance(e, InvalidStationIds):
+        return f"Error: {e}"
     if isinstance(e, httpx.HTTPStatusError):
         return f"Error: API returned status {e.response.status_code}. {e.response.text[:300]}"
     if isinstance(e, httpx.TimeoutException):
@@ -79,6 +273,7 @@ def _handle_error(e: Exception) -> str:
         "idempotentHint": True,
         "openWorldHint": True,
     },
+    structured_output=False,
 )
 async def get_metar(
     ids: str,
@@ -101,11 +296,17 @@ async def get_metar(
         the raw observation text.
     """
     try:
-        params = {"ids": ids, "format": format or "json"}
-        if hours is not None:
-            params["hours"] = hours
-        data = await _awc_get("metar", params)
-        return json.dumps(data, indent=2) if isinstance(data, (dict, list)) else data
+        params = {
+            k: v
+            for k, v in (
+                ("ids", _normalize_ids(ids)),
+                ("format", format or "json"),
+                ("hours", hours),
+            )
+            if v is not None
+        }
+        r = await _awc_get("metar", params)
+        return _dumps(r.data) if r.is_json else r.data
     except Exception as e:
         return _handle_error(e)
 
@@ -119,6 +320,7 @@ async def get_metar(
         "idempotentHint": True,
         "openWorldHint": True,
     },
+    structured_output=False,
 )
 async def get_taf(
     ids: str,
@@ -139,9 +341,45 @@ async def get_taf(
         conditions. JSON format includes the raw TAF and decoded forecast change groups.
     """
     try:
-        params = {"ids": ids, "format": format or "json"}
-        data = await _awc_get("taf", params)
-        return json.dumps(data, indent=2) if isinstance(data, (dict, list)) else data
+        params = {"ids": _normalize_ids(ids), "format": format or "json"}
+        r = await _awc_get("taf", params)
+        return _dumps(r.data) if r.is_json else r.data
+    except Exception as e:
+        return _handle_error(e)
+
+
+@mcp.tool(
+    name="get_wx",
+    annotations={
+        "title": "Get METAR and TAF Together",
+        "readOnlyHint": True,
+        "destructiveHint": False,
+        "idempotentHint": True,
+        "openWorldHint": True,
+    },
+    structured_output=False,
+)
+async def get_wx(
+    ids: str,
+    format: Optional[str] = "json",
+) -> str:
+    """Fetch the latest METAR and the current TAF for one or more airports in one call.
+
+    Both requests are made concurrently, so this is faster than calling
+    get_metar and get_taf one after the other.
+
+    Args:
+        ids: ICAO station identifiers, comma-separated (e.g. 'KTUS', 'KORD,KJFK').
+        format: Output format for both products – 'json' (default) or 'raw'.
+
+    Returns:
+        A JSON object with 'metar' and 'taf' keys, each holding the data that
+        get_metar and get_taf would return for the same stations.
+    """
+    try:
+        params = {"ids": _normalize_ids(ids), "format": format or "json"}
+        metar, taf = await _awc_get_many([("metar", params), ("taf", params)])
+        return _dumps({"metar": metar.data, "taf": taf.data})
     except Exception as e:
         return _handle_error(e)
 
@@ -155,6 +393,7 @@ async def get_taf(
         "idempotentHint": True,
         "openWorldHint": True,
     },
+    structured_output=False,
 )
 async def get_pireps(
     id: Optional[str] = None,
@@ -179,15 +418,18 @@ async def get_pireps(
         icing, sky conditions, temperature, wind, and remarks.
     """
     try:
-        params = {"format": format or "json"}
-        if id:
-            params["id"] = id
-        if distance is not None:
-            params["distance"] = distance
-        if age is not None:
-            params["age"] = age
-        data = await _awc_get("pirep", params)
-        return json.dumps(data, indent=2) if isinstance(data, (dict, list)) else data
+        params = {
+            k: v
+            for k, v in (
+                ("format", format or "json"),
+                ("id", id or None),
+                ("distance", distance),
+                ("age", age),
+            )
+            if v is not None
+        }
+        r = await _awc_get("pirep", params)
+        return _dumps(r.data) if r.is_json else r.data
     except Exception as e:
         return _handle_error(e)
 
@@ -201,6 +443,7 @@ async def get_pireps(
         "idempotentHint": True,
         "openWorldHint": True,
     },
+    structured_output=False,
 )
 async def get_airsigmet(
     format: Optional[str] = "json",
@@ -224,11 +467,13 @@ async def get_airsigmet(
         altitude range, and valid times.
     """
     try:
-        params = {"format": format or "json"}
-        if hazard:
-            params["hazard"] = hazard
-        data = await _awc_get("airsigmet", params)
-        return json.dumps(data, indent=2) if isinstance(data, (dict, list)) else data
+        params = {
+            k: v
+            for k, v in (("format", format or "json"), ("hazard", hazard or None))
+            if v is not None
+        }
+        r = await _awc_get("airsigmet", params)
+        return _dumps(r.data) if r.is_json else r.data
     except Exception as e:
         return _handle_error(e)
 
@@ -242,6 +487,7 @@ async def get_airsigmet(
         "idempotentHint": True,
         "openWorldHint": True,
     },
+    structured_output=False,
 )
 async def get_station_info(
     ids: str,
@@ -261,9 +507,9 @@ async def get_station_info(
         and available data types.
     """
     try:
-        params = {"ids": ids, "format": format or "json"}
-        data = await _awc_get("stationinfo", params)
-        return json.dumps(data, indent=2) if isinstance(data, (dict, list)) else data
+        params = {"ids": _normalize_ids(ids), "format": format or "json"}
+        r = await _awc_get("stationinfo", params)
+        return _dumps(r.data) if r.is_json else r.data
     except Exception as e:
         return _handle_error(e)
 
@@ -272,6 +518,21 @@ async def get_station_info(
 # Run
 # ---------------------------------------------------------------------------
 
+async def _serve() -> None:
+    """Run the streamable HTTP server, closing the shared client on shutdown."""
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        await _close_client()
+
+
 if __name__ == "__main__":
+    logging.basicConfig(format="[%(levelname)s] %(message)s", level=logging.INFO, force=True)
     logger.info("Starting Aviation Weather MCP server")
-    mcp.run(transport="streamable-http")
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:  # uvloop is optional and unavailable on Windows
+        backend_options = {}
+    else:
+        backend_options = {"use_uvloop": True}
+    anyio.run(_serve, backend_options=backend_options)